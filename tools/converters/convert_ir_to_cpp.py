@@ -17,10 +17,18 @@ Output: C++ header file with constexpr float array for IR convolution.
 
 import sys
 import os
+import io
 import re
+import math
+import hashlib
 import argparse
+import array
+import tempfile
 import struct
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
+from typing import Union
 
 # Try to import scipy for resampling, fall back to simple interpolation
 try:
@@ -38,94 +46,139 @@ except ImportError:
     HAS_NUMPY = False
 
 
+# Sample buffers: a float64 ndarray when NumPy is available, otherwise a
+# list or array.array('f')
+Samples = Union[list, array.array, 'np.ndarray']
+
 MAX_IR_LENGTH = 2048
 TARGET_SAMPLE_RATE = 48000
+CACHE_DIR = Path(__file__).resolve().parent / '.cache'
+
+_SANITIZE_RE = re.compile(r'[^a-zA-Z0-9_]')
+
+IR_HEADER_TEMPLATE = """\
+#pragma once
+// Auto-generated from IR file: {source_file}
+// Original: {original_rate}Hz, {original_channels}ch, {original_length} samples
+// Processed: {sample_rate}Hz, mono, {length} samples, normalized
+// DO NOT EDIT - regenerate using convert_ir_to_cpp.py
+
+#include <cstddef>
+
+namespace EmbeddedIRs {{
+namespace {identifier} {{
+
+constexpr const char* kName = "{display_name}";
+constexpr int kSampleRate = {sample_rate};
+constexpr int kLength = {length};
+
+// Impulse response samples (mono, normalized)
+{samples}
+
+}} // namespace {identifier}
+}} // namespace EmbeddedIRs
+"""
 
 
 def sanitize_name(name: str) -> str:
     """Convert filename to valid C++ identifier."""
     name = Path(name).stem
-    name = re.sub(r'[^a-zA-Z0-9_]', '_', name)
+    name = _SANITIZE_RE.sub('_', name)
     if name[0].isdigit():
         name = '_' + name
     return name
 
 
+def decode_pcm_numpy(raw_data: bytes, bits_per_sample: int) -> 'np.ndarray':
+    """Decode little-endian PCM/float WAV data to a float32 array."""
+    if bits_per_sample == 16:
+        return np.frombuffer(raw_data, dtype='<i2').astype(np.float32) * (1.0 / 32768.0)
+    if bits_per_sample == 24:
+        # Assemble 3-byte frames into int32, sign-extending from the top byte
+        b = np.frombuffer(raw_data, dtype=np.uint8)[:len(raw_data) // 3 * 3].reshape(-1, 3)
+        values = (b[:, 0].astype(np.int32)
+                  | (b[:, 1].astype(np.int32) << 8)
+                  | (b[:, 2].astype(np.int8).astype(np.int32) << 16))
+        return values.astype(np.float32) * (1.0 / 8388608.0)
+    if bits_per_sample == 32:
+        # Assume float
+        return np.frombuffer(raw_data, dtype='<f4').astype(np.float32)
+    raise ValueError(f"Unsupported bit depth: {bits_per_sample}")
+
+
 def read_wav_simple(path: str) -> tuple:
     """Read WAV file without scipy (basic implementation)."""
     with open(path, 'rb') as f:
-        # RIFF header
-        riff = f.read(4)
-        if riff != b'RIFF':
-            raise ValueError("Not a WAV file")
-
-        f.read(4)  # file size
-        wave = f.read(4)
-        if wave != b'WAVE':
-            raise ValueError("Not a WAV file")
-
-        # Find fmt chunk
-        fmt_found = False
-        data_found = False
-        sample_rate = 0
-        num_channels = 0
-        bits_per_sample = 0
-        audio_data = []
-
-        while True:
-            chunk_id = f.read(4)
-            if len(chunk_id) < 4:
-                break
-
-            chunk_size = struct.unpack('<I', f.read(4))[0]
-
-            if chunk_id == b'fmt ':
-                fmt_data = f.read(chunk_size)
-                audio_format = struct.unpack('<H', fmt_data[0:2])[0]
-                num_channels = struct.unpack('<H', fmt_data[2:4])[0]
-                sample_rate = struct.unpack('<I', fmt_data[4:8])[0]
-                bits_per_sample = struct.unpack('<H', fmt_data[14:16])[0]
-                fmt_found = True
-
-            elif chunk_id == b'data':
-                raw_data = f.read(chunk_size)
-
-                # Convert to float samples
-                if bits_per_sample == 16:
-                    samples = struct.unpack(f'<{len(raw_data)//2}h', raw_data)
-                    audio_data = [s / 32768.0 for s in samples]
-                elif bits_per_sample == 24:
-                    # 24-bit is trickier
-                    samples = []
-                    for i in range(0, len(raw_data), 3):
-                        b = raw_data[i:i+3]
-                        val = struct.unpack('<i', b + (b'\xff' if b[2] & 0x80 else b'\x00'))[0]
-                        samples.append(val / 8388608.0)
-                    audio_data = samples
-                elif bits_per_sample == 32:
-                    # Assume float
-                    samples = struct.unpack(f'<{len(raw_data)//4}f', raw_data)
-                    audio_data = list(samples)
-                else:
-                    raise ValueError(f"Unsupported bit depth: {bits_per_sample}")
-
-                data_found = True
-            else:
-                f.read(chunk_size)  # Skip unknown chunk
-
-        if not fmt_found or not data_found:
-            raise ValueError("Invalid WAV file structure")
-
-        return sample_rate, num_channels, audio_data
-
-
-def simple_resample(data: list, src_rate: int, dst_rate: int) -> list:
+        wav = memoryview(f.read())
+
+    # RIFF header
+    if len(wav) < 12 or wav[0:4] != b'RIFF' or wav[8:12] != b'WAVE':
+        raise ValueError("Not a WAV file")
+
+    # Walk chunks by offset, remembering where fmt and data live
+    fmt_data = None
+    raw_data = None
+    pos = 12
+    while pos + 8 <= len(wav):
+        chunk_id = wav[pos:pos+4]
+        chunk_size = struct.unpack_from('<I', wav, pos + 4)[0]
+        body = wav[pos+8:pos+8+chunk_size]
+
+        if chunk_id == b'fmt ':
+            fmt_data = body
+        elif chunk_id == b'data':
+            raw_data = body
+
+        # Chunks are word-aligned
+        pos += 8 + chunk_size + (chunk_size & 1)
+
+    if fmt_data is None or raw_data is None:
+        raise ValueError("Invalid WAV file structure")
+
+    num_channels, sample_rate = struct.unpack_from('<HI', fmt_data, 2)
+    bits_per_sample = struct.unpack_from('<H', fmt_data, 14)[0]
+
+    # Convert to float samples
+    if HAS_NUMPY:
+        audio_data = decode_pcm_numpy(raw_data, bits_per_sample)
+    elif bits_per_sample == 16:
+        samples = array.array('h')
+        samples.frombytes(raw_data)
+        if sys.byteorder == 'big':
+            samples.byteswap()
+        audio_data = array.array('f', (s * (1.0 / 32768.0) for s in samples))
+    elif bits_per_sample == 24:
+        # 24-bit is trickier
+        raw_data = raw_data.tobytes()
+        audio_data = array.array('f')
+        for i in range(0, len(raw_data), 3):
+            b = raw_data[i:i+3]
+            val = struct.unpack('<i', b + (b'\xff' if b[2] & 0x80 else b'\x00'))[0]
+            audio_data.append(val / 8388608.0)
+    elif bits_per_sample == 32:
+        # Assume float
+        audio_data = array.array('f')
+        audio_data.frombytes(raw_data)
+        if sys.byteorder == 'big':
+            audio_data.byteswap()
+    else:
+        raise ValueError(f"Unsupported bit depth: {bits_per_sample}")
+
+    return sample_rate, num_channels, audio_data
+
+
+def simple_resample(data: Samples, src_rate: int, dst_rate: int) -> Samples:
     """Simple linear interpolation resampling."""
     if src_rate == dst_rate:
         return data
 
     ratio = dst_rate / src_rate
     new_length = int(len(data) * ratio)
+
+    if HAS_NUMPY:
+        x_new = np.arange(new_length, dtype=np.float64) / ratio
+        return np.interp(x_new, np.arange(len(data)), data)
+
     result = []
 
     for i in range(new_length):
@@ -146,7 +199,9 @@ def load_ir(path: str) -> tuple:
     """
     Load and process IR file.
 
-    Returns (samples, original_sample_rate, original_channels, original_length)
+    Returns (samples, original_sample_rate, original_channels, original_length).
+    Samples are a float64 ndarray when NumPy is available, otherwise a list
+    or array.array('f').
     """
     if HAS_SCIPY:
         sample_rate, data = wavfile.read(path)
@@ -168,17 +223,24 @@ def load_ir(path: str) -> tuple:
 
         # Resample if needed
         if sample_rate != TARGET_SAMPLE_RATE:
+            # Polyphase FIR avoids the wrap-around ringing of FFT resampling
+            # on non-periodic signals like IRs
             num_samples = int(len(data) * TARGET_SAMPLE_RATE / sample_rate)
-            data = signal.resample(data, num_samples)
+            g = math.gcd(TARGET_SAMPLE_RATE, sample_rate)
+            data = signal.resample_poly(data, TARGET_SAMPLE_RATE // g, sample_rate // g)
+            data = data[:num_samples]
 
-        samples = data.tolist()
+        samples = data.astype(np.float64)
     else:
         # Fallback without scipy
         sample_rate, num_channels, raw_samples = read_wav_simple(path)
         original_length = len(raw_samples) // num_channels
 
         # Convert stereo to mono
-        if num_channels > 1:
+        if num_channels > 1 and HAS_NUMPY:
+            frames = raw_samples[:original_length * num_channels]
+            samples = frames.reshape(-1, num_channels).mean(axis=1, dtype=np.float64)
+        elif num_channels > 1:
             samples = []
             for i in range(0, len(raw_samples), num_channels):
                 mono = sum(raw_samples[i:i+num_channels]) / num_channels
@@ -196,21 +258,33 @@ def load_ir(path: str) -> tuple:
     return samples, original_sample_rate, original_channels, original_length
 
 
-def normalize_ir(samples: list) -> list:
-    """Normalize IR to peak amplitude of 1.0."""
+def _peak(arr) -> float:
+    """Peak absolute value; min/max reductions avoid an abs() temporary."""
+    return max(-float(arr.min()), float(arr.max())) if arr.size else 0.0
+
+
+def _fade_out(result, max_length: int) -> None:
+    """Apply the truncation fade-out in place to the tail of an ndarray."""
+    fade_len = min(64, max_length // 8)
+    if fade_len:
+        result[max_length - fade_len:] *= 1.0 - np.arange(fade_len) / fade_len
+
+
+def normalize_ir(samples: Samples) -> Samples:
+    """Normalize IR to peak amplitude of 1.0 (pure-Python path of process_ir)."""
     peak = max(abs(s) for s in samples)
     if peak > 0:
         return [s / peak for s in samples]
     return samples
 
 
-def truncate_ir(samples: list, max_length: int = MAX_IR_LENGTH) -> list:
-    """Truncate IR to maximum length with fade-out."""
+def truncate_ir(samples: Samples, max_length: int = MAX_IR_LENGTH) -> Samples:
+    """Truncate IR to maximum length with fade-out (pure-Python path of process_ir)."""
     if len(samples) <= max_length:
         return samples
 
     # Apply short fade-out at end to avoid clicks
-    result = samples[:max_length]
+    result = list(samples[:max_length])
     fade_len = min(64, max_length // 8)
     for i in range(fade_len):
         fade = 1.0 - (i / fade_len)
@@ -219,67 +293,158 @@ def truncate_ir(samples: list, max_length: int = MAX_IR_LENGTH) -> list:
     return result
 
 
-def format_array(values: list, name: str, indent: str = "    ") -> str:
-    """Format a flat list of floats as a C++ constexpr array."""
-    lines = [f"constexpr float {name}[] = {{"]
+def process_ir(samples: Samples, max_length: int = MAX_IR_LENGTH) -> Samples:
+    """Normalize and truncate an IR, equivalent to truncate_ir(normalize_ir(...)).
+
+    With NumPy the peak is taken over the full IR, but only the kept samples
+    are divided into a fresh buffer, which is then faded in place.
+    """
+    if not HAS_NUMPY:
+        return truncate_ir(normalize_ir(samples), max_length)
+
+    arr = np.asarray(samples, dtype=np.float64)
+    peak = _peak(arr)
+    kept = arr[:max_length]
+    result = kept / peak if peak > 0 else kept.copy()
+    if len(arr) > max_length:
+        _fade_out(result, max_length)
+    return result
+
+
+def format_array(values: Samples, name: str, out: io.StringIO, indent: str = "    ") -> None:
+    """Write a flat sequence of floats to out as a C++ constexpr array."""
+    out.write(f"constexpr float {name}[] = {{\n")
+
+    # Plain Python floats format fastest
+    if HAS_NUMPY:
+        values = np.asarray(values).tolist()
+    tokens = [f"{v:+.8f}f" for v in values]
 
     # Format 6 values per line for readability
-    for i in range(0, len(values), 6):
-        chunk = values[i:i+6]
-        formatted = ", ".join(f"{v:+.8f}f" for v in chunk)
-        if i + 6 < len(values):
-            formatted += ","
-        lines.append(f"{indent}{formatted}")
+    for i in range(0, len(tokens), 6):
+        out.write(indent)
+        out.write(", ".join(tokens[i:i+6]))
+        out.write(",\n" if i + 6 < len(tokens) else "\n")
 
-    lines.append("};")
-    return "\n".join(lines)
+    out.write("};")
 
 
-def generate_header(samples: list, identifier: str, display_name: str,
+def generate_header(samples: Samples, identifier: str, display_name: str,
                    original_rate: int, original_channels: int,
                    original_length: int, source_file: str) -> str:
     """Generate C++ header content for an IR."""
+    context = {
+        'source_file': source_file,
+        'original_rate': original_rate,
+        'original_channels': original_channels,
+        'original_length': original_length,
+        'sample_rate': TARGET_SAMPLE_RATE,
+        'length': len(samples),
+        'identifier': identifier,
+        'display_name': display_name,
+    }
+
+    # Stream the sample array between the two halves of the template
+    head, tail = IR_HEADER_TEMPLATE.split('{samples}')
+    buf = io.StringIO()
+    buf.write(head.format(**context))
+    format_array(samples, 'kSamples', buf)
+    buf.write(tail.format(**context))
+    return buf.getvalue()
+
+
+def write_if_changed(path: Path, content: bytes) -> bool:
+    """Write content unless the file already holds it. Returns True if written.
+
+    Leaving identical headers untouched keeps their mtime, so build caches
+    don't recompile everything that includes them.
+    """
+    try:
+        with open(path, 'rb') as f:
+            if f.read() == content:
+                return False
+    except FileNotFoundError:
+        pass
 
-    header = f'''#pragma once
-// Auto-generated from IR file: {source_file}
-// Original: {original_rate}Hz, {original_channels}ch, {original_length} samples
-// Processed: {TARGET_SAMPLE_RATE}Hz, mono, {len(samples)} samples, normalized
-// DO NOT EDIT - regenerate using convert_ir_to_cpp.py
+    with open(path, 'wb') as f:
+        f.write(content)
+    return True
 
-#include <cstddef>
 
-namespace EmbeddedIRs {{
-namespace {identifier} {{
+def cache_path_for(input_path: str) -> Path:
+    """Cache entry for an input, named <path hash>-<content key hash>.h.
 
-constexpr const char* kName = "{display_name}";
-constexpr int kSampleRate = {TARGET_SAMPLE_RATE};
-constexpr int kLength = {len(samples)};
+    The key covers everything the header depends on: the input as named
+    (not resolved, since identifier and kName come from the name), its
+    mtime and size, this script's version, and which backends are loaded.
+    """
+    src = Path(input_path).absolute()
+    st = src.stat()
+    script_mtime = Path(__file__).stat().st_mtime_ns
+    key = (f"{src}|{st.st_mtime_ns}|{st.st_size}|{script_mtime}"
+           f"|scipy={HAS_SCIPY}|numpy={HAS_NUMPY}")
+    path_hash = hashlib.blake2b(str(src).encode(), digest_size=8).hexdigest()
+    key_hash = hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+    return CACHE_DIR / f"{path_hash}-{key_hash}.h"
+
+
+def read_cache(cache_path: Path):
+    """Return the cached header bytes, or None on a miss or unreadable cache."""
+    try:
+        return cache_path.read_bytes()
+    except OSError:
+        return None
 
-// Impulse response samples (mono, normalized)
-{format_array(samples, 'kSamples')}
 
-}} // namespace {identifier}
-}} // namespace EmbeddedIRs
-'''
-    return header
+def store_cache(cache_path: Path, content: bytes) -> None:
+    """Atomically store a cache entry and evict older entries for the same input.
+
+    The cache is only an optimization: if it can't be written (e.g. a
+    read-only checkout), the entry is silently skipped.
+    """
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=CACHE_DIR, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(content)
+            os.replace(tmp_name, cache_path)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+
+        path_hash = cache_path.name.split('-', 1)[0]
+        for stale in CACHE_DIR.glob(f"{path_hash}-*.h"):
+            if stale != cache_path:
+                stale.unlink(missing_ok=True)
+    except OSError:
+        pass
 
 
 def convert_file(input_path: str, output_dir: str, force: bool = False) -> bool:
     """Convert a single IR file. Returns True on success."""
     try:
+        identifier = sanitize_name(input_path)
+        output_path = Path(output_dir) / f"{identifier}.h"
+        cache_path = cache_path_for(input_path)
+
+        # Reuse the previous result if neither the input nor the script changed
+        cached = None if force else read_cache(cache_path)
+        if cached is not None:
+            output_path.parent.mkdir(parents=True, exist_ok=True)
+            write_if_changed(output_path, cached)
+            print(f"OK {input_path} (cached) -> {output_path}")
+            return True
+
         # Load and process
         samples, orig_rate, orig_channels, orig_length = load_ir(input_path)
 
-        # Normalize
-        samples = normalize_ir(samples)
-
-        # Truncate
+        # Normalize and truncate
         if len(samples) > MAX_IR_LENGTH:
             print(f"  Truncating from {len(samples)} to {MAX_IR_LENGTH} samples")
-        samples = truncate_ir(samples, MAX_IR_LENGTH)
+        samples = process_ir(samples, MAX_IR_LENGTH)
 
         # Generate output
-        identifier = sanitize_name(input_path)
         display_name = Path(input_path).stem.replace('_', ' ').replace('-', ' ')
         header = generate_header(
             samples, identifier, display_name,
@@ -288,14 +453,16 @@ def convert_file(input_path: str, output_dir: str, force: bool = False) -> bool:
         )
 
         # Write output
-        output_path = Path(output_dir) / f"{identifier}.h"
         output_path.parent.mkdir(parents=True, exist_ok=True)
 
-        with open(output_path, 'w') as f:
-            f.write(header)
+        content = header.encode()
+        written = write_if_changed(output_path, content)
+
+        store_cache(cache_path, content)
 
         info = f"{orig_rate}Hz/{orig_channels}ch -> {len(samples)} samples"
-        print(f"OK {input_path} ({info}) -> {output_path}")
+        status = "" if written else ", unchanged"
+        print(f"OK {input_path} ({info}{status}) -> {output_path}")
         return True
 
     except Exception as e:
@@ -313,7 +480,7 @@ def main():
     parser.add_argument('--batch', action='store_true',
                        help='Process all .wav files in input directory')
     parser.add_argument('--force', '-f', action='store_true',
-                       help='Overwrite existing files')
+                       help='Regenerate even if a cached result is up to date')
 
     args = parser.parse_args()
 
@@ -326,15 +493,28 @@ def main():
             print(f"Error: {args.input} is not a directory")
             sys.exit(1)
 
-        wav_files = list(input_dir.glob('*.wav')) + list(input_dir.glob('*.WAV'))
+        wav_files = set(input_dir.glob('*.wav')) | set(input_dir.glob('*.WAV'))
         if not wav_files:
             print(f"No .wav files found in {args.input}")
             sys.exit(1)
 
-        success = 0
+        # Inputs that sanitize to the same identifier would have concurrent
+        # workers writing one header, so only the first of each is converted
+        groups = {}
         for wav_file in sorted(wav_files):
-            if convert_file(str(wav_file), args.output_dir, args.force):
-                success += 1
+            groups.setdefault(sanitize_name(str(wav_file)), []).append(str(wav_file))
+
+        paths = []
+        for identifier, group in groups.items():
+            paths.append(group[0])
+            for duplicate in group[1:]:
+                print(f"ERROR {duplicate}: {identifier}.h is already generated from {group[0]}")
+
+        # Each file converts independently, so fan out across processes
+        chunksize = max(1, len(paths) // (4 * (os.cpu_count() or 1)))
+        convert = partial(convert_file, output_dir=args.output_dir, force=args.force)
+        with ProcessPoolExecutor() as executor:
+            success = sum(executor.map(convert, paths, chunksize=chunksize))
 
         print(f"\nConverted {success}/{len(wav_files)} IRs")
     else: